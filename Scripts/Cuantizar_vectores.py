@@ -0,0 +1,28 @@
+import chromadb
+
+from agentes.Indice_cuantizado import QuantizedIndex
+
+
+def main():
+    """
+    Genera el índice cuantizado (bits de signo + int8) a partir de una colección ya existente,
+    sin volver a procesar los documentos ni recalcular embeddings.
+    """
+    chroma_db_path = r'Hunger-Wings\database\chromadb'
+    index_path = r'Hunger-Wings\database\quantized_index.npz'
+
+    chroma_client = chromadb.PersistentClient(path=chroma_db_path)
+    collection = chroma_client.get_collection(name='biology')
+
+    print(f"Leyendo {collection.count()} vectores de la colección '{collection.name}'...")
+    quantized_index = QuantizedIndex.from_collection(collection)
+    quantized_index.save(index_path)
+
+    fp32_bytes = quantized_index.codes.size * 4
+    print(f"-> Índice guardado en {index_path}")
+    print(f"-> FP32: {fp32_bytes / 1e6:.1f} MB | bits de signo: {quantized_index.bits.nbytes / 1e6:.1f} MB"
+          f" | total cuantizado: {quantized_index.nbytes() / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,159 +1,226 @@
 import os
 import glob
-import uuid
-from langchain_ollama import OllamaEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document
-from langchain_chroma import Chroma
+import hashlib
+import json
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import httpx
+import chromadb
+import semchunk
+import tiktoken
 from langchain_community.document_loaders import PyPDFLoader
 
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=510,
-    chunk_overlap=50,
-    length_function=len,
-    separators=['\n', '.', '\n\n']
-)
-
-embeddings_generator = OllamaEmbeddings(
-    model='mxbai-embed-large:latest'
-)
-
-chroma_db_path = r'Hunger-Wings\database\chromadb'
-
-# Inicialización de la base de datos
-vector_store = Chroma(
-    persist_directory=chroma_db_path,
-    embedding_function=embeddings_generator,
-    collection_name='biology'
-)
-
-# Lógica para procesar todos los txt.
-
-# Especificación de ruta
-docs_path = r'Hunger-Wings\database\docs'
-
-txt_files = glob.glob(os.path.join(docs_path, '*.txt'))
-
-print(f"📄 Se encontraron {len(txt_files)} archivos .txt para procesar.")
-
-for file_path in txt_files:
-    try:
-        file_name = os.path.splitext(os.path.basename(file_path))[0]
-        
-        print(f"\nProcesando archivo: {file_name}.txt")
-
-        # Lee el contenido del archivo
-        with open(file_path, 'r', encoding='utf-8') as file:
-            txt_text = file.read()
-
-        # Divide el texto en chunks
-        text_chunks = text_splitter.split_text(txt_text)
-        print(f"-> Texto dividido en {len(text_chunks)} chunks.")
-
-        # Procesamiento de cada chunk
-        documents_to_add = []
-        for chunk in text_chunks:
-            document = Document(
-                id=str(uuid.uuid4()),
-                page_content=chunk,
-                # Metadatos dinámicos
-                metadata={
-                    'name': file_name,
-                    'source': file_path,
-                }
-            )
-            documents_to_add.append(document)
-        
-        if documents_to_add:
-            vector_store.add_documents(documents_to_add)
-            print(f"-> Se agregaron {len(documents_to_add)} documentos a la base de datos.")
-
-    except Exception as e:
-        print(f"Error procesando el archivo {file_path}: {e}")
-        continue
-
-print("\nLa base de datos ha sido generada con todos los archivos.")
-
-print("\nRealizando una búsqueda de prueba...")
-search_results = vector_store.similarity_search('experimental animal procedures for STS-131', 5)
-
-print("\nResultados de la búsqueda:")
-for result in search_results:
-    # Imprimime datos del archivo
-    print(f"Fuente: {result.metadata.get('name', 'N/A')}.txt")
-    print(f"Contenido: {result.page_content[:200]}...\n")
-
-
-"""
-from langchain_ollama import OllamaEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document
-from langchain_chroma import Chroma
-import uuid
-from langchain_community.document_loaders import PyPDFLoader
-
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=510,
-    chunk_overlap=50,
-    length_function=len,
-    separators=['\n', '.', '\n\n']
-)
-
-embeddings_generator = OllamaEmbeddings(
-    model='mxbai-embed-large:latest'
-)
-
-chroma_db_path = 'Hunger-Wings\database\chromadb'
-
-vector_store = Chroma(
-    persist_directory=chroma_db_path,
-    embedding_function=embeddings_generator,
-    collection_name='pokemon'
-)
+from langchain_core.embeddings import Embeddings
+
+from agentes.Generador_embeddings import crear_embeddings, normalize_embeddings
+from agentes.Indice_cuantizado import QuantizedIndex
+
+# Divisor de texto por tokens: semchunk recorre el texto una sola vez y tiktoken tokeniza en Rust.
+# 128 tokens equivalen aproximadamente a los 510 caracteres del divisor anterior.
+chunk_tokens = 128
+chunk_overlap_tokens = 12
+
+# Mensajes de falta de memoria: 'oom' solo como palabra completa (no en "room" o "zoom")
+_OOM_PATTERN = re.compile(r'out of memory|\boom\b')
+
+chunker = semchunk.chunkerify(tiktoken.get_encoding('cl100k_base'), chunk_size=chunk_tokens)
+
+
+def split_text(text: str) -> list:
+    return chunker(text, overlap=chunk_overlap_tokens)
+
+
+def _is_retryable(error: Exception) -> bool:
+    """
+    Indica si el error del servidor de embeddings se debe a un lote demasiado grande
+    (timeout, 413, 5xx o falta de memoria).
+    """
+    if isinstance(error, httpx.TimeoutException):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 413 or error.response.status_code >= 500
+    message = str(error).lower()
+    return _OOM_PATTERN.search(message) is not None
+
+
+def embed_with_backoff(embeddings_generator: Embeddings, texts: list, size: int) -> tuple:
+    """
+    Genera los embeddings de `texts` en lotes de `size` (TEI, o varios servidores de Ollama).
 
-txt_path = 'Hunger-Wings\database\docs\Microgravity Induces Pelvic Bone Loss through Osteoclastic Activity.txt'
-txt_text = ''
-
-with open(txt_path, 'r', encoding='utf-8') as file:
-    txt_text = file.read()
-
-print(len(txt_text))
+    Si un lote falla por un error recuperable, se reintenta con la mitad del tamaño
+    (hasta 1). Devuelve los embeddings y el tamaño de lote que funcionó de forma estable.
+    """
+    while True:
+        embeddings_generator.batch_size = size
+        try:
+            return embeddings_generator.embed_documents(texts), size
+        except Exception as e:
+            if size == 1 or not _is_retryable(e):
+                raise
+            size //= 2
+            print(f"-> Lote rechazado por el servidor de embeddings ({e}). Reintentando con lotes de {size}.")
+
+
+def file_digest(path: str, window: int = 262144) -> str:
+    """
+    Calcula el hash blake2b del archivo leyéndolo por bloques.
+    """
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as file:
+        while block := file.read(window):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def iter_chunks(path: str, split, window: int = 262144):
+    """
+    Lee el archivo en ventanas de `window` caracteres y genera sus chunks de forma perezosa.
+
+    El último fragmento de cada ventana puede estar cortado, así que se guarda y se vuelve
+    a dividir junto con la ventana siguiente. La memoria usada queda acotada a una ventana
+    en lugar de al tamaño completo del archivo.
+
+    Es una aproximación: en archivos más largos que una ventana, los chunks pueden no
+    coincidir con los de dividir el texto completo de una vez, porque el splitter recursivo
+    elige los cortes según el texto que ve. Los chunks siguen respetando el tamaño máximo,
+    pero los IDs (que dependen del contenido) pueden cambiar al modificar `window`.
+    """
+    carry = ''
+    with open(path, 'r', encoding='utf-8') as file:
+        while buffer := file.read(window):
+            pieces = split(carry + buffer)
+            carry = pieces.pop() if pieces else ''
+            yield from pieces
+    if carry:
+        yield carry
+
+
+def split_file(file_path: str) -> tuple:
+    """
+    Divide un archivo en chunks con IDs deterministas.
+
+    Es una función pura para poder ejecutarse en un proceso aparte: la división del texto
+    es trabajo de CPU, mientras que los embeddings esperan a la red.
+    """
+    file_name = os.path.splitext(os.path.basename(file_path))[0]
+
+    # IDs deterministas: el mismo chunk del mismo archivo siempre tiene el mismo ID,
+    # así que volver a ingerir no duplica datos. El nombre del archivo entra en el hash
+    # para que un texto repetido en dos artículos conserve ambas fuentes.
+    chunks_by_id = {
+        hashlib.blake2b(f'{file_name}\n{chunk}'.encode('utf-8'), digest_size=16).hexdigest(): chunk
+        for chunk in iter_chunks(file_path, split_text)
+    }
+    return file_name, file_path, list(chunks_by_id), list(chunks_by_id.values())
+
+
+def main():
+    # Embeddings por lotes con el backend de EMBEDDINGS_BACKEND (Ollama por defecto, TEI u ONNX en proceso)
+    embeddings_generator = crear_embeddings()
+
+    # Número inicial de chunks enviados en cada petición (acotado a [1, 256])
+    batch_size = min(max(int(os.getenv('OLLAMA_EMBED_BATCH_SIZE', '32')), 1), 256)
+
+    chroma_db_path = r'Hunger-Wings\database\chromadb'
+
+    # Inicialización de la base de datos (colección nativa de Chroma, sin el wrapper de LangChain).
+    # Los embeddings se guardan normalizados, así que la distancia es el producto interno.
+    chroma_client = chromadb.PersistentClient(path=chroma_db_path)
+    collection = chroma_client.get_or_create_collection('biology', metadata={'hnsw:space': 'ip'})
+
+    # Lógica para procesar todos los txt.
+
+    # Especificación de ruta
+    docs_path = r'Hunger-Wings\database\docs'
+
+    txt_files = glob.glob(os.path.join(docs_path, '*.txt'))
+
+    # Manifiesto de archivos ya ingeridos (ruta -> hash del contenido)
+    manifest_path = r'Hunger-Wings\database\.ingest_manifest.json'
+
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+    else:
+        manifest = {}
+
+    print(f"📄 Se encontraron {len(txt_files)} archivos .txt para procesar.")
+
+    # Si el contenido no cambió desde la última ingesta, no se vuelve a embeber
+    file_hashes = {}
+    for file_path in txt_files:
+        file_hash = file_digest(file_path)
+        if manifest.get(file_path) == file_hash:
+            print(f"-> {os.path.basename(file_path)} sin cambios desde la última ingesta, se omite.")
+        else:
+            file_hashes[file_path] = file_hash
+
+    # Los archivos se dividen en paralelo en otros procesos; el proceso principal
+    # genera los embeddings de cada archivo a medida que termina su división.
+    with ProcessPoolExecutor() as pool:
+        futures = {pool.submit(split_file, file_path): file_path for file_path in file_hashes}
+
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                file_name, _, ids, text_chunks = future.result()
+                file_hash = file_hashes[file_path]
+
+                print(f"\nProcesando archivo: {file_name}.txt")
+                print(f"-> Texto dividido en {len(text_chunks)} chunks.")
+
+                # Se eliminan siempre los chunks anteriores del archivo antes de insertar los nuevos:
+                # también los de ingestas sin manifiesto (con IDs aleatorios), que el upsert no reemplaza
+                collection.delete(where={'name': file_name})
+
+                if text_chunks:
+                    # El siguiente archivo empieza con el último tamaño estable
+                    embeddings, batch_size = embed_with_backoff(embeddings_generator, text_chunks, batch_size)
+                    embeddings = normalize_embeddings(embeddings)
+
+                    # Una sola inserción por archivo con los embeddings ya calculados
+                    collection.upsert(
+                        ids=ids,
+                        embeddings=embeddings,
+                        documents=text_chunks,
+                        # Metadatos dinámicos
+                        metadatas=[{'name': file_name, 'source': file_path, 'file_hash': file_hash} for _ in text_chunks]
+                    )
+                    print(f"-> Se agregaron {len(text_chunks)} documentos a la base de datos.")
+                    print(f"-> Tamaño de lote estable: {batch_size}")
+
+                # Se registra el archivo solo después de insertarlo completo
+                manifest[file_path] = file_hash
+                with open(manifest_path, 'w', encoding='utf-8') as file:
+                    json.dump(manifest, file, indent=2, ensure_ascii=False)
+
+            except Exception as e:
+                print(f"Error procesando el archivo {file_path}: {e}")
+                continue
+
+    print("\nLa base de datos ha sido generada con todos los archivos.")
+
+    # Copia binaria + int8 de los embeddings para buscar leyendo mucha menos memoria que el HNSW de Chroma
+    quantized_index = QuantizedIndex.from_collection(collection)
+    quantized_index.save(r'Hunger-Wings\database\quantized_index.npz')
+    print(f"-> Índice cuantizado generado con {len(quantized_index.ids)} vectores.")
+
+    print("\nRealizando una búsqueda de prueba...")
+    query_embedding = normalize_embeddings(embeddings_generator.embed_query('experimental animal procedures for STS-131'))
+    search_results = collection.query(
+        query_embeddings=[query_embedding],
+        n_results=5
+    )
 
-text_chunks = text_splitter.split_text(txt_text)
-print(len(text_chunks))
+    print("\nResultados de la búsqueda:")
+    for content, metadata in zip(search_results['documents'][0], search_results['metadatas'][0]):
+        # Imprimime datos del archivo
+        print(f"Fuente: {metadata.get('name', 'N/A')}.txt")
+        print(f"Contenido: {content[:200]}...\n")
 
-for chunk in text_chunks:
-    document = Document(
-        id=str(uuid.uuid4()),
-        page_content=chunk,
-        metadata={
-            'name': 'Microgravity Induces Pelvic Bone Loss through Osteoclastic Activity',
-            'source': 'https://www.ncbi.nlm.nih.gov/pmc/articles/PMC3630201/',
-            }
-    )
 
-    vector_store.add_documents([document])
-
-resultados = vector_store.similarity_search('experimental animal procedures for STS-131', 5)
-
-print("-" * 70)
-print("🔎 Resultados de la Búsqueda de Similitud para 'experimental animal procedures for STS-131' 🔎")
-print("-" * 70)
-
-# Iteramos sobre cada documento encontrado
-for i, doc in enumerate(resultados):
-    # Extraemos el texto del documento
-    contenido_encontrado = doc.page_content
-    
-    # Intentamos obtener la fuente/metadata (normalmente la ruta del archivo)
-    # Usamos .get() para evitar errores si la metadata no contiene 'source'
-    fuente = doc.metadata.get('source', 'Fuente no especificada')
-    
-    # Imprimimos el resultado con formato
-    print(f"\n--- Documento Relevante #{i+1} ---")
-    print(f"📄 Fuente: {fuente}")
-    
-    # Imprimimos los primeros 700 caracteres del texto para concisión
-    print(f"📝 Texto Relevante:\n{contenido_encontrado[:700]}...") 
-    print("-" * 30)
-    """
\ No newline at end of file
+if __name__ == '__main__':
+    # 'spawn' evita heredar por fork los archivos abiertos de Chroma en los procesos hijos
+    multiprocessing.set_start_method('spawn')
+    main()
@@ -1,14 +1,14 @@
 from langchain_chroma import Chroma
-from langchain_ollama import OllamaEmbeddings
 from langchain_google_genai import ChatGoogleGenerativeAI
 import os
 import json
+import functools
 from dotenv import load_dotenv
-import csv # Importamos el módulo csv necesario
-from typing import Dict # Para tipado
 
 # Importa tu clase de agente
 from agentes.Agente_semantico import BiologySemanticAgent
+from agentes.Generador_embeddings import crear_embeddings
+from agentes.Metadatos_articulos import load_metadata_from_csv
 
 # Cargar las variables de entorno (Asegúrate que el .env esté en la ruta correcta)
 load_dotenv('Hunger-Wings\.env')
@@ -17,43 +17,6 @@ load_dotenv('Hunger-Wings\.env')
 CSV_PATH = r'Hunger-Wings\database\SB_publication_PMC.csv'
 
 # --- 0. Cargar y Mapear Metadatos del CSV ---
-
-def load_metadata_from_csv(csv_filepath: str) -> Dict[str, str]:
-    """
-    Carga los títulos y links del CSV, mapeando el título a su URL.
-    
-    Se limpia la clave del título eliminando cualquier ruta y la extensión.
-    """
-    metadata_map = {}
-    try:
-        # Se asume que el CSV usa UTF-8 y las columnas son 'title' y 'link'
-        with open(csv_filepath, mode='r', encoding='utf-8') as csvfile:
-            # Usamos DictReader para manejar las columnas por nombre
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                # Obtenemos el título del CSV (podría contener una ruta si el CSV no es perfecto)
-                title_key_full = row.get('title', '').strip()
-                
-                # 1. Eliminamos la ruta completa, dejando solo el nombre del archivo (ej: 'archivo.txt').
-                filename_with_ext = os.path.basename(title_key_full)
-                
-                # 2. Eliminamos la extensión del archivo (ej: '.txt') para estandarizar la clave.
-                title_key_clean, _ = os.path.splitext(filename_with_ext)
-                
-                link_value = row.get('link', '').strip()
-                
-                if title_key_clean and link_value:
-                    # La clave del mapa es el título limpio (solo nombre del archivo, sin ruta ni extensión)
-                    metadata_map[title_key_clean] = link_value
-        print(f"DEBUG: CSV cargado exitosamente. Se mapearon {len(metadata_map)} registros de metadatos.")
-        return metadata_map
-    except FileNotFoundError:
-        print(f"⚠️ Error: El archivo CSV no se encontró en la ruta: {csv_filepath}. Los links no estarán disponibles.")
-        return {}
-    except Exception as e:
-        print(f"❌ Error al procesar el archivo CSV: {e}")
-        return {}
-
 ARTICLE_LINK_MAP = load_metadata_from_csv(CSV_PATH)
 
 
@@ -71,35 +34,55 @@ if not gemini_key:
 print(f"DEBUG: GEMINI_API_KEY cargada correctamente (longitud: {len(gemini_key)} caracteres)")
 
 # Inicialización de Gemini LLM (response_mime_type es esencial para el JSON)
-gemini_llm = ChatGoogleGenerativeAI(
-    model='gemini-2.5-flash',
-    api_key=gemini_key,
-    response_mime_type="application/json"
-)
+@functools.lru_cache(maxsize=1)
+def get_llm() -> ChatGoogleGenerativeAI:
+    return ChatGoogleGenerativeAI(
+        model='gemini-2.5-flash',
+        api_key=gemini_key,
+        response_mime_type="application/json"
+    )
+
 
 # ----------------------------------------------------
 ## 2. Configuración de RAG
 # ----------------------------------------------------
+# Cada componente se construye una sola vez por proceso (aunque el módulo se importe
+# desde varios sitios), así el índice HNSW y las conexiones se mantienen calientes.
+
+# Configuración de Embeddings (Debe coincidir con la ingesta: Ollama por defecto, o TEI/ONNX vía EMBEDDINGS_BACKEND)
+@functools.lru_cache(maxsize=1)
+def get_embeddings():
+    return crear_embeddings()
 
-# Configuración de Embeddings (Debe coincidir con la ingesta)
-embeddings_generator = OllamaEmbeddings(
-    model='mxbai-embed-large'
-)
 
 # Configuración de Chroma Vector Store (Asegúrate de la ruta y collection_name)
-vector_store = Chroma(
-    collection_name='biology',
-    embedding_function=embeddings_generator,
-    persist_directory='Hunger-Wings\database\chromadb'
-)
+@functools.lru_cache(maxsize=1)
+def get_vector_store() -> Chroma:
+    vector_store = Chroma(
+        collection_name='biology',
+        embedding_function=get_embeddings(),
+        persist_directory='Hunger-Wings\database\chromadb'
+    )
+
+    # Calentamiento: carga el modelo de embeddings y el índice HNSW antes de la primera consulta real
+    get_embeddings().embed_query('warmup')
+    vector_store.similarity_search('warmup', k=1)
+    return vector_store
+
 
 # Instanciación del Agente Biológico
 # PASAMOS EL MAPA DE LINKS AL AGENTE
-agent = BiologySemanticAgent(
-    vector_store,
-    gemini_llm,
-    article_link_map=ARTICLE_LINK_MAP # <--- NUEVO ARGUMENTO: El agente debe usar este mapa
-)
+@functools.lru_cache(maxsize=1)
+def get_agent() -> BiologySemanticAgent:
+    return BiologySemanticAgent(
+        get_vector_store(),
+        get_llm(),
+        article_link_map=ARTICLE_LINK_MAP # <--- NUEVO ARGUMENTO: El agente debe usar este mapa
+    )
+
+
+vector_store = get_vector_store()
+agent = get_agent()
 
 # ----------------------------------------------------
 ## 3. Prueba de Recuperación (Diagnóstico del Problema)
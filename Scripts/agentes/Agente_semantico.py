@@ -1,15 +1,25 @@
+import asyncio
+import collections
+import functools
 import json
-from typing import List, Dict, Any
+import os
+import re
+import threading
+from typing import List, Dict, Any, AsyncIterator, Iterator, Tuple
 
+import numpy as np
+import orjson
 from langchain_core.documents import Document
-from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.utils.json import parse_partial_json
 from langchain_core.vectorstores import VectorStore
-# Se asume que _PROMP y _JSON_SCHEMA están definidos en este archivo o se importan.
-# Para este ejemplo, los definiremos como placeholders.
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
 
-# ----------------------------------------------------
-# PLACEHOLDERS: Sustituye esto con tus definiciones reales
-# ----------------------------------------------------
+from .Cache_semantico import SemanticCache
+from .Despachador_lotes import BatchDispatcher
+from .Generador_embeddings import normalize_embeddings
+from .Indice_cuantizado import QuantizedIndex
+
+# Esquema JSON que debe cumplir la respuesta del LLM (reporte + grafo de conceptos)
 _JSON_SCHEMA = {
     "type": "object",
     "properties": {
@@ -61,9 +71,102 @@ Contexto Filtrado (Documentos Fuente y Metadatos):
 
 Pregunta del Usuario: {question}
 """
-# ----------------------------------------------------
-# FIN DE PLACEHOLDERS
-# ----------------------------------------------------
+
+# Partes constantes del prompt, separadas una sola vez al importar: cada prompt se arma
+# concatenando en lugar de interpretar la plantilla con str.format
+_P_PRE, _P_REST = _PROMPT.split("{contexto_filtrado}")
+_P_MID, _P_SUF = _P_REST.split("{question}")
+
+# Candidatos pedidos a Chroma, candidatos que pasan a MMR tras re-ordenar por coseno exacto,
+# y peso de la relevancia frente a la diversidad en MMR
+_OVERSAMPLE_K = 50
+_FETCH_K = 30
+_MMR_LAMBDA = 0.5
+
+
+def _cosine_top_k(query: np.ndarray, matrix: np.ndarray, k: int) -> np.ndarray:
+    """
+    Devuelve las filas de `matrix` con mayor similitud coseno con `query`, ordenadas.
+
+    Una sola multiplicación matriz-vector para todos los candidatos, en lugar de un bucle por vector.
+    """
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    norms[norms == 0] = 1.0
+    similarities = (matrix @ query) / norms
+
+    k = min(k, len(similarities))
+    top = np.argpartition(-similarities, k - 1)[:k]
+    return top[np.argsort(-similarities[top])]
+
+
+# Preguntas distintas cuyo embedding se guarda en memoria (por agente)
+_QUESTION_EMBEDDINGS_SIZE = 2048
+
+# Link usado para los artículos que no aparecen en el CSV (una sola cadena compartida)
+_LINK_MISSING = 'Link No Encontrado'
+
+# Máximo de caracteres de cada documento en el prompt (se corta en el último final de frase)
+_MAX_CONTENT_CHARS = 1500
+
+
+def _truncate_at_sentence(text: str, max_chars: int) -> str:
+    """
+    Recorta el texto a `max_chars` caracteres sin partir la última frase.
+
+    Si no hay un final de frase en la segunda mitad del recorte, se corta en el último espacio.
+    """
+    if len(text) <= max_chars:
+        return text
+
+    cut = text[:max_chars]
+    end = max(cut.rfind('. '), cut.rfind('! '), cut.rfind('? '), cut.rfind('.\n'))
+    if end >= max_chars // 2:
+        return cut[:end + 1]
+    return cut.rsplit(' ', 1)[0]
+
+
+# Palabras que indican una pregunta amplia (resumen, comparación) que necesita más contexto.
+# Se buscan como palabras completas: "resumed" o "comparable" no cuentan
+_BROAD_KEYWORDS = re.compile(
+    r'\b(?:resumen(?:es)?|res[uú]me(?:lo|los|me)|resumir|resumidamente'
+    r'|compara(?:r|ción|cion|tiva)?|comp[aá]ralos'
+    r'|diferencias?|summary|summari[sz]e|compare|comparison|differences?)\b',
+    re.IGNORECASE
+)
+
+
+def _choose_budget(question: str) -> Tuple[int, int]:
+    """
+    Elige cuántos chunks recuperar y cuántos caracteres enviar de cada uno según la pregunta.
+
+    Las preguntas cortas y concretas se responden con poco contexto; las largas, o las que
+    piden un resumen o una comparación, reciben más chunks.
+    """
+    if _BROAD_KEYWORDS.search(question):
+        return 8, _MAX_CONTENT_CHARS
+
+    n_words = len(question.split())
+    if n_words < 8:
+        return 2, 800
+    if n_words <= 20:
+        return 3, 1200
+    return 5, _MAX_CONTENT_CHARS
+
+
+@functools.lru_cache(maxsize=8192)
+def _fragment_for(title: str, link: str, content: str, max_chars: int = _MAX_CONTENT_CHARS) -> str:
+    """
+    Serializa un documento del contexto a JSON compacto, con el contenido recortado a `max_chars`.
+
+    Los mismos chunks se recuperan para muchas preguntas, así que el fragmento
+    se calcula una sola vez por documento y se reutiliza.
+    """
+    # orjson (en C) genera JSON compacto y UTF-8 directamente, sin escapar los acentos
+    return orjson.dumps({
+        "source_title": title,
+        "source_link": link,
+        "content": _truncate_at_sentence(content, max_chars)
+    }).decode()
 
 
 class BiologySemanticAgent:
@@ -71,81 +174,457 @@ class BiologySemanticAgent:
     Agente que realiza RAG sobre una base de datos vectorial
     y estructura la respuesta en un formato JSON para visualización de grafo.
     """
-    # 1. ACTUALIZACIÓN DEL CONSTRUCTOR PARA ACEPTAR article_link_map
-    def __init__(self, vector_store: VectorStore, llm, article_link_map: Dict[str, str]):
+    def __init__(self, vector_store: VectorStore, llm, article_link_map: Dict[str, str] | None = None,
+                 cache_threshold: float = 0.85, quantized_index: QuantizedIndex | None = None):
         self.vector_store = vector_store
-        self.llm = llm
-        self.article_link_map = article_link_map  # Almacenamos el mapa de links
-        
-        # Inicializa el parser de JSON
-        self.json_parser = JsonOutputParser()
-        self.prompt_template = _PROMPT
-        
-        # Cadena de Generación: Prompt -> LLM (forzado JSON) -> Parser (a dict de Python)
-        # La cadena se construye en generate para incluir el contexto dinámicamente.
+        # El esquema y el tipo MIME se fijan una vez: Gemini devuelve JSON que cumple _JSON_SCHEMA
+        self.llm = llm.bind(response_schema=_JSON_SCHEMA, response_mime_type="application/json")
+        # Mapa título -> link; los títulos que no están en el CSV devuelven _LINK_MISSING
+        self.article_link_map = collections.defaultdict(lambda: _LINK_MISSING, article_link_map or {})
+
+        # Índice cuantizado opcional: si existe, la búsqueda se hace en él y Chroma solo aporta el texto
+        self.quantized_index = quantized_index
+
+        # Caché semántica: preguntas parecidas (similitud >= cache_threshold) reutilizan la respuesta
+        self.cache = SemanticCache(threshold=cache_threshold)
 
+        # Despachador de lotes para el LLM (opcional, se activa con enable_batching)
+        self.dispatcher: BatchDispatcher | None = None
 
-    def _prepare_context(self, documents: List[Document]) -> str:
+        # Embeddings de preguntas ya vistas (LRU): repetir una pregunta no vuelve a llamar al modelo de embeddings
+        self._question_embeddings: collections.OrderedDict[str, List[float]] = collections.OrderedDict()
+        self._question_embeddings_lock = threading.Lock()
+
+
+    @staticmethod
+    def _document_title(doc: Document) -> str:
+        """
+        Devuelve el título limpio del artículo: la metadato 'name' de la ingesta o,
+        si no existe, el nombre del archivo de 'source' sin ruta ni extensión.
+        """
+        # La ingesta se hizo con rutas de Windows: se normalizan los separadores antes de basename
+        source = doc.metadata.get('source', '').replace('\\', '/')
+        title = doc.metadata.get('name') or os.path.splitext(os.path.basename(source))[0]
+        return title or 'Título Desconocido'
+
+
+    def _prepare_context(self, documents: List[Document], max_chars: int = _MAX_CONTENT_CHARS) -> str:
         """
         Prepara los documentos para el prompt, enriqueciendo los metadatos con el 'link' del CSV.
         
-        Se asume que la metadato 'source' de LangChain contiene el TÍTULO exacto del artículo
-        usado como clave en ARTICLE_LINK_MAP.
+        El título del artículo (clave en ARTICLE_LINK_MAP) se toma de la metadato 'name'
+        en lugar de la ruta completa de 'source', que solo gastaba tokens.
         """
-        prepared_data = []
+        fragments = []
         
         for doc in documents:
-            title = doc.metadata.get('source', 'Título Desconocido')
+            title = self._document_title(doc)
             # 2. USAMOS EL MAPA PARA BUSCAR EL LINK
-            link = self.article_link_map.get(title, 'Link No Encontrado') 
+            link = self.article_link_map[title]
             
-            # Crea un diccionario simple con los datos relevantes para el LLM
-            # Incluimos el link para que el LLM lo use al llenar el campo 'articulos' del JSON.
-            prepared_data.append({
-                "source_title": title,
-                "source_link": link,
-                "snippet": doc.page_content[:200] + "...", # Recortar para no saturar el prompt
-                "full_page_content": doc.page_content
-            })
+            # Cada documento aporta título, link (para que el LLM llene el campo 'articulos' del JSON)
+            # y contenido. No se incluye un 'snippet': era una copia de los primeros 200 caracteres.
+            fragments.append(_fragment_for(title, link, doc.page_content, max_chars))
 
-        # Serializa la lista de diccionarios para inyectarla en el prompt
-        return json.dumps(prepared_data, indent=2, ensure_ascii=False)
+        # Une los fragmentos en una lista JSON para inyectarla en el prompt.
+        # Sin sangría ni espacios: el LLM no los necesita y cada uno cuenta como token.
+        return '[' + ','.join(fragments) + ']'
 
 
-    def generate(self, question: str, k_chunks: int) -> Dict[str, Any] | None:
+    def enable_batching(self, max_batch_size: int = 8, max_wait: float = 0.05) -> BatchDispatcher:
         """
-        Realiza la recuperación y la generación de la respuesta estructurada.
+        Activa el agrupamiento de peticiones en agenerate: las preguntas que lleguen dentro
+        de `max_wait` segundos se embeben, se buscan en Chroma y se envían a Gemini en lote.
+
+        Debe llamarse desde el event loop (p. ej. en el evento 'startup' de FastAPI).
         """
-        # 1. Recuperación
-        retrieved_docs = self.vector_store.similarity_search(question, k_chunks)
-        
+        self.dispatcher = BatchDispatcher(self._agenerate_batch, max_batch_size=max_batch_size, max_wait=max_wait)
+        self.dispatcher.start()
+        return self.dispatcher
+
+
+    def _embed_questions(self, questions: List[str]) -> List[List[float]]:
+        """
+        Genera los embeddings de las preguntas, normalizados igual que en la ingesta.
+
+        Las preguntas ya vistas salen de la caché LRU; las demás se embeben juntas en una
+        sola llamada y se guardan. Los resultados no deben modificarse.
+        """
+        with self._question_embeddings_lock:
+            found = {}
+            for question in questions:
+                if question in self._question_embeddings:
+                    self._question_embeddings.move_to_end(question)
+                    found[question] = self._question_embeddings[question]
+
+        missing = list(dict.fromkeys(question for question in questions if question not in found))
+        if missing:
+            if len(missing) == 1:
+                raw_embeddings = [self.vector_store.embeddings.embed_query(missing[0])]
+            else:
+                raw_embeddings = self.vector_store.embeddings.embed_documents(missing)
+            computed = dict(zip(missing, normalize_embeddings(raw_embeddings).tolist()))
+
+            with self._question_embeddings_lock:
+                self._question_embeddings.update(computed)
+                while len(self._question_embeddings) > _QUESTION_EMBEDDINGS_SIZE:
+                    self._question_embeddings.popitem(last=False)
+            found.update(computed)
+
+        return [found[question] for question in questions]
+
+
+    def _embed_question(self, question: str) -> List[float]:
+        return self._embed_questions([question])[0]
+
+
+    def _build_prompt(self, question: str, documents: List[Document], max_chars: int = _MAX_CONTENT_CHARS) -> str:
+        """
+        Construye el prompt final con el contexto de los documentos recuperados.
+        """
+        return f"{_P_PRE}{self._prepare_context(documents, max_chars)}{_P_MID}{question}{_P_SUF}"
+
+
+    @staticmethod
+    def _budget(question: str, k_chunks: int | None) -> Tuple[int, int]:
+        """
+        Devuelve (k_chunks, caracteres por chunk): el presupuesto adaptativo si no se indicó
+        `k_chunks`, o el valor pedido con el recorte por defecto.
+        """
+        if k_chunks is None:
+            return _choose_budget(question)
+        return k_chunks, _MAX_CONTENT_CHARS
+
+
+    def _retrieve(self, question_embedding: List[float], k_chunks: int) -> List[Document]:
+        """
+        Recupera los chunks para la pregunta con Maximal Marginal Relevance.
+
+        Se piden _FETCH_K candidatos al índice (una sola búsqueda) y se eligen `k_chunks`
+        relevantes pero poco redundantes, para no llenar el contexto con fragmentos casi iguales.
+        """
+        if self.quantized_index is not None:
+            top_ids = self.quantized_index.mmr_search(
+                question_embedding, k_chunks, fetch_k=max(_FETCH_K, k_chunks), lambda_mult=_MMR_LAMBDA
+            )
+            docs_by_id = {doc.id: doc for doc in self.vector_store.get_by_ids(top_ids)}
+            return [docs_by_id[doc_id] for doc_id in top_ids if doc_id in docs_by_id]
+
+        if getattr(self.vector_store, '_collection', None) is not None:
+            return self._retrieve_batch([question_embedding], [k_chunks])[0]
+
+        return self.vector_store.max_marginal_relevance_search_by_vector(
+            question_embedding, k=k_chunks, fetch_k=max(_FETCH_K, k_chunks), lambda_mult=_MMR_LAMBDA
+        )
+
+
+    def _retrieve_batch(self, question_embeddings: List[List[float]], k_chunks_list: List[int]) -> List[List[Document]]:
+        """
+        Recupera los chunks de varias preguntas con una sola consulta a Chroma.
+
+        Para cada pregunta se piden _OVERSAMPLE_K candidatos con sus embeddings, se re-ordenan
+        por similitud coseno exacta (el HNSW es aproximado y la colección puede usar distancia L2),
+        y MMR elige `k_chunks` entre los _FETCH_K mejores.
+        """
+        collection = getattr(self.vector_store, '_collection', None)
+        if self.quantized_index is not None or collection is None:
+            return [self._retrieve(embedding, k) for embedding, k in zip(question_embeddings, k_chunks_list)]
+
+        raw = collection.query(
+            query_embeddings=question_embeddings,
+            n_results=max(_OVERSAMPLE_K, *k_chunks_list),
+            include=['documents', 'metadatas', 'embeddings']
+        )
+
+        results = []
+        for i, (embedding, k) in enumerate(zip(question_embeddings, k_chunks_list)):
+            if not raw['ids'][i]:
+                results.append([])
+                continue
+
+            query = np.asarray(embedding, dtype=np.float32)
+            candidates = np.asarray(raw['embeddings'][i], dtype=np.float32)
+            reranked = _cosine_top_k(query, candidates, max(_FETCH_K, k))
+            selected = maximal_marginal_relevance(query, candidates[reranked], lambda_mult=_MMR_LAMBDA, k=k)
+
+            rows = [int(reranked[j]) for j in selected]
+            results.append([
+                Document(id=raw['ids'][i][row], page_content=raw['documents'][i][row], metadata=raw['metadatas'][i][row] or {})
+                for row in rows
+            ])
+        return results
+
+
+    def _retrieve_prompt(self, question: str, question_embedding: List[float], k_chunks: int,
+                         max_chars: int = _MAX_CONTENT_CHARS) -> str | None:
+        """
+        Recupera los chunks y arma el prompt en un solo paso, para ejecutarlo entero en un hilo
+        (la serialización del contexto tampoco ocupa el event loop). None si no hay documentos.
+        """
+        retrieved_docs = self._retrieve(question_embedding, k_chunks)
+
         if not retrieved_docs:
             print("No se recuperaron documentos para generar la respuesta.")
             return None
+        return self._build_prompt(question, retrieved_docs, max_chars)
 
-        # 2. Preparación del Contexto (con links inyectados)
-        contexto_json = self._prepare_context(retrieved_docs)
 
-        # 3. Creación del Prompt Final
-        prompt_with_context = self.prompt_template.format(
-            contexto_filtrado=contexto_json,
-            question=question
+    def _retrieve_prompts(self, questions: List[str], question_embeddings: List[List[float]],
+                          k_chunks_list: List[int], max_chars_list: List[int]) -> List[str | None]:
+        """
+        Versión por lotes de _retrieve_prompt: una sola consulta a Chroma para todas las preguntas.
+        """
+        prompts = []
+        retrieved = self._retrieve_batch(question_embeddings, k_chunks_list)
+        for question, retrieved_docs, max_chars in zip(questions, retrieved, max_chars_list):
+            if not retrieved_docs:
+                print("No se recuperaron documentos para generar la respuesta.")
+                prompts.append(None)
+                continue
+            prompts.append(self._build_prompt(question, retrieved_docs, max_chars))
+        return prompts
+
+
+    def _parse_response(self, response) -> Dict[str, Any] | None:
+        """
+        Convierte la respuesta del LLM (o la excepción que produjo) en el dict JSON final.
+        """
+        if isinstance(response, Exception):
+            print(f"Error durante la generación del JSON: {response}")
+            return None
+        # .text une los bloques de texto si el contenido llega como lista; orjson solo acepta str exacto
+        try:
+            return orjson.loads(str(response.text))
+        except (orjson.JSONDecodeError, TypeError) as e:
+            print(f"Error durante el parseo del JSON: {e}")
+            return None
+
+
+    def _finish_response(self, question_embedding: List[float], k_chunks: int, max_chars: int, response) -> Dict[str, Any] | None:
+        """
+        Parsea la respuesta del LLM y, si es válida, la guarda en la caché semántica.
+        """
+        json_response = self._parse_response(response)
+        if json_response is not None:
+            self.cache.put(question_embedding, k_chunks, max_chars, json_response)
+        return json_response
+
+
+    async def _agenerate_batch(self, requests: List[Tuple[str, int, int]]) -> List[Dict[str, Any] | None]:
+        """
+        Procesa un lote de (pregunta, k_chunks, caracteres por chunk) con una llamada por etapa:
+        embeddings, consulta a Chroma y LLM. Lo usa el despachador de enable_batching.
+        """
+        questions = [question for question, _, _ in requests]
+
+        # 0. Embeddings (solo las preguntas nuevas, en una sola petición) y consulta a la caché semántica
+        question_embeddings = await asyncio.to_thread(self._embed_questions, questions)
+
+        results = [
+            self.cache.get(embedding, k_chunks, max_chars)
+            for embedding, (_, k_chunks, max_chars) in zip(question_embeddings, requests)
+        ]
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+
+        # 1-2. Recuperación de todas las preguntas pendientes (una sola consulta) y prompts, en un hilo
+        pending_prompts = await asyncio.to_thread(
+            self._retrieve_prompts,
+            [questions[i] for i in pending],
+            [question_embeddings[i] for i in pending],
+            [requests[i][1] for i in pending],
+            [requests[i][2] for i in pending]
         )
-        
-        # 4. Configuración y Ejecución de la Cadena
+        prompts = [(i, prompt) for i, prompt in zip(pending, pending_prompts) if prompt is not None]
+
+        if not prompts:
+            return results
+
+        # 3. Un solo lote al LLM
+        responses = await self.llm.abatch(
+            [[("user", prompt)] for _, prompt in prompts],
+            config={"max_concurrency": len(prompts)},
+            return_exceptions=True
+        )
+
+        for (i, _), response in zip(prompts, responses):
+            results[i] = self._finish_response(question_embeddings[i], requests[i][1], requests[i][2], response)
+        return results
+
+
+    def generate(self, question: str, k_chunks: int | None = None) -> Dict[str, Any] | None:
+        """
+        Realiza la recuperación y la generación de la respuesta estructurada.
+
+        Si no se indica `k_chunks`, el número de chunks y su longitud se eligen según la pregunta.
+        """
+        k_chunks, max_chars = self._budget(question, k_chunks)
+
+        # 0. Consulta a la caché semántica con el embedding (normalizado, igual que en la ingesta)
+        question_embedding = self._embed_question(question)
+        cached_response = self.cache.get(question_embedding, k_chunks, max_chars)
+        if cached_response is not None:
+            return cached_response
+
+        # 1-2. Recuperación (reutiliza el embedding ya calculado) y Prompt Final con los links inyectados
+        prompt_with_context = self._retrieve_prompt(question, question_embedding, k_chunks, max_chars)
+        if prompt_with_context is None:
+            return None
+
+        # 3. Ejecución del LLM (ya configurado en __init__ para devolver JSON con el esquema)
         try:
-            # Usamos el LLM directamente ya que la cadena se complica con el formato
-            # El LLM ya está inicializado para devolver JSON según el Canvas (response_mime_type)
-            response = self.llm.invoke(
-                [("user", prompt_with_context)],
-                config={"response_schema": _JSON_SCHEMA}
-            )
-            
-            # Intenta parsear la respuesta de texto (que debería ser JSON)
-            json_text = response.content.strip()
-            return json.loads(json_text)
+            response = self.llm.invoke([("user", prompt_with_context)])
+        except Exception as e:
+            response = e
+
+        return self._finish_response(question_embedding, k_chunks, max_chars, response)
+
+
+    async def agenerate(self, question: str, k_chunks: int | None = None) -> Dict[str, Any] | None:
+        """
+        Versión asíncrona de generate.
+
+        Mientras se espera a Chroma o a Gemini el event loop queda libre, así el servidor
+        atiende otras peticiones en lugar de bloquearse en cada llamada de red. Si el
+        agrupamiento está activo, la pregunta se procesa en lote con las demás concurrentes.
+        """
+        k_chunks, max_chars = self._budget(question, k_chunks)
+
+        if self.dispatcher is not None:
+            return await self.dispatcher.submit((question, k_chunks, max_chars))
 
+        # 0. Consulta a la caché semántica (el embedding se calcula en un hilo aparte)
+        question_embedding = await asyncio.to_thread(self._embed_question, question)
+        cached_response = self.cache.get(question_embedding, k_chunks, max_chars)
+        if cached_response is not None:
+            return cached_response
+
+        # 1-2. Recuperación y Prompt Final en un hilo: el event loop sigue atendiendo otras peticiones
+        prompt_with_context = await asyncio.to_thread(self._retrieve_prompt, question, question_embedding, k_chunks, max_chars)
+        if prompt_with_context is None:
+            return None
+
+        # 3. Ejecución asíncrona del LLM
+        try:
+            response = await self.llm.ainvoke([("user", prompt_with_context)])
         except Exception as e:
-            print(f"Error durante la generación o parseo del JSON: {e}")
-            # print(f"Respuesta del LLM (si disponible): {response.content}")
+            response = e
+
+        return self._finish_response(question_embedding, k_chunks, max_chars, response)
+
+
+    def _parse_partial(self, json_text: str) -> Dict[str, Any] | None:
+        """
+        Convierte el texto JSON recibido hasta ahora en un dict parcial (cierra las cadenas,
+        listas y objetos abiertos). Devuelve None si todavía no se puede interpretar.
+        """
+        try:
+            return parse_partial_json(json_text)
+        except json.JSONDecodeError:
+            return None
+
+
+    def _cache_streamed(self, question_embedding: List[float], k_chunks: int, max_chars: int, json_text: str) -> Dict[str, Any] | None:
+        """
+        Guarda en la caché la respuesta completa de un streaming, si es un JSON válido.
+
+        Devuelve el dict validado, o None si el texto completo no se pudo parsear.
+        """
+        try:
+            json_response = orjson.loads(json_text)
+        except orjson.JSONDecodeError as e:
+            print(f"Error durante el parseo del JSON: {e}")
             return None
+        self.cache.put(question_embedding, k_chunks, max_chars, json_response)
+        return json_response
+
+
+    def generate_stream(self, question: str, k_chunks: int | None = None) -> Iterator[Dict[str, Any]]:
+        """
+        Versión de generate que entrega el JSON a medida que el LLM lo genera.
+
+        Cada elemento es el dict construido hasta ese momento: el campo reporte.resumen
+        aparece y crece antes de que lleguen los hallazgos y el grafo. El último es la respuesta completa.
+        """
+        k_chunks, max_chars = self._budget(question, k_chunks)
+
+        # 0. Caché semántica: si hay respuesta guardada se entrega de una vez
+        question_embedding = self._embed_question(question)
+        cached_response = self.cache.get(question_embedding, k_chunks, max_chars)
+        if cached_response is not None:
+            yield cached_response
+            return
+
+        # 1. Recuperación y prompt
+        prompt_with_context = self._retrieve_prompt(question, question_embedding, k_chunks, max_chars)
+        if prompt_with_context is None:
+            return
+
+        # 2. Generación en streaming; si el LLM falla, se registra el error y el stream termina
+        json_text = ''
+        last_partial = None
+        try:
+            for chunk in self.llm.stream([("user", prompt_with_context)]):
+                json_text += chunk.content
+                partial = self._parse_partial(json_text)
+                if partial and partial != last_partial:
+                    last_partial = partial
+                    yield partial
+        except Exception as e:
+            print(f"Error durante la generación del JSON: {e}")
+            return
+
+        # 3. Si la respuesta completa es un JSON válido, se guarda en la caché
+        self._cache_streamed(question_embedding, k_chunks, max_chars, json_text)
+
+
+    async def astream(self, question: str, k_chunks: int | None = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Versión asíncrona de generate_stream: la recuperación no bloquea el event loop y el
+        primer dict parcial se envía en cuanto Gemini empieza a responder.
+        """
+        async for partial, _ in self.astream_with_status(question, k_chunks):
+            yield partial
+
+
+    async def astream_with_status(self, question: str, k_chunks: int | None = None) -> AsyncIterator[Tuple[Dict[str, Any], bool]]:
+        """
+        Igual que astream, pero cada elemento es (dict, completo).
+
+        `completo` solo es True en el último elemento, cuando la respuesta entera es un JSON
+        válido (o viene de la caché). Si el stream termina sin un elemento completo, el LLM
+        falló a mitad de la respuesta o esta no era JSON válido: el reporte quedó truncado.
+        """
+        k_chunks, max_chars = self._budget(question, k_chunks)
+
+        # 0. Caché semántica: si hay respuesta guardada se entrega de una vez
+        question_embedding = await asyncio.to_thread(self._embed_question, question)
+        cached_response = self.cache.get(question_embedding, k_chunks, max_chars)
+        if cached_response is not None:
+            yield cached_response, True
+            return
+
+        # 1. Recuperación y prompt en un hilo
+        prompt_with_context = await asyncio.to_thread(self._retrieve_prompt, question, question_embedding, k_chunks, max_chars)
+        if prompt_with_context is None:
+            return
+
+        # 2. Generación en streaming; si el LLM falla, se registra el error y el stream termina
+        json_text = ''
+        last_partial = None
+        try:
+            async for chunk in self.llm.astream([("user", prompt_with_context)]):
+                json_text += chunk.content
+                partial = self._parse_partial(json_text)
+                if partial and partial != last_partial:
+                    last_partial = partial
+                    yield partial, False
+        except Exception as e:
+            print(f"Error durante la generación del JSON: {e}")
+            return
+
+        # 3. Si la respuesta completa es un JSON válido, se guarda en la caché y se entrega validada
+        json_response = self._cache_streamed(question_embedding, k_chunks, max_chars, json_text)
+        if json_response is not None:
+            yield json_response, True
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Caché en memoria de respuestas, indexada por el embedding de la pregunta.
+
+    Una pregunta se considera repetida cuando la similitud coseno con una pregunta ya
+    guardada (y el mismo presupuesto de contexto: número de chunks y caracteres por chunk) es mayor o igual a `threshold`. Las entradas
+    caducan tras `ttl` segundos y, al llegar a `max_entries`, se descarta la usada hace más tiempo.
+    """
+    def __init__(self, threshold: float = 0.85, ttl: float = 300.0, max_entries: int = 1000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        # Matriz de embeddings normalizados: la búsqueda es un único producto matriz-vector
+        self._vectors: np.ndarray | None = None
+        self._k_chunks = np.zeros(max_entries, dtype=np.int32)
+        self._max_chars = np.zeros(max_entries, dtype=np.int32)
+        self._valid = np.zeros(max_entries, dtype=bool)
+
+        # Fila de la matriz -> (respuesta, instante de caducidad), en orden de uso (LRU)
+        self._entries: OrderedDict[int, tuple] = OrderedDict()
+        self._free_rows = list(range(max_entries))
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _release(self, row: int):
+        del self._entries[row]
+        self._valid[row] = False
+        self._free_rows.append(row)
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for row in [row for row, (_, expires_at) in self._entries.items() if expires_at <= now]:
+            self._release(row)
+
+    def get(self, embedding: List[float], k_chunks: int, max_chars: int) -> Dict[str, Any] | None:
+        """
+        Devuelve la respuesta guardada para la pregunta más parecida, o None si no hay ninguna
+        por encima del umbral.
+        """
+        with self._lock:
+            self._evict_expired()
+            if not self._entries:
+                return None
+
+            similarities = self._vectors @ self._normalize(embedding)
+            same_budget = (self._k_chunks == k_chunks) & (self._max_chars == max_chars)
+            similarities[~(self._valid & same_budget)] = -np.inf
+
+            best_row = int(np.argmax(similarities))
+            if similarities[best_row] < self.threshold:
+                return None
+
+            self._entries.move_to_end(best_row)
+            return self._entries[best_row][0]
+
+    def put(self, embedding: List[float], k_chunks: int, max_chars: int, response: Dict[str, Any]):
+        """
+        Guarda la respuesta generada para la pregunta representada por `embedding`.
+        """
+        vector = self._normalize(embedding)
+
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+
+            self._evict_expired()
+            if not self._free_rows:
+                # Descarta la entrada usada hace más tiempo
+                self._release(next(iter(self._entries)))
+
+            row = self._free_rows.pop()
+            self._vectors[row] = vector
+            self._k_chunks[row] = k_chunks
+            self._max_chars[row] = max_chars
+            self._valid[row] = True
+            self._entries[row] = (response, time.monotonic() + self.ttl)
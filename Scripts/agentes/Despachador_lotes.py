@@ -0,0 +1,106 @@
+import asyncio
+from typing import Any, Awaitable, Callable, List, Tuple
+
+
+class BatchDispatcher:
+    """
+    Agrupa las peticiones que llegan dentro de una ventana corta (`max_wait` segundos)
+    y las procesa juntas con una sola llamada a `handler`.
+
+    `handler` recibe la lista de peticiones y devuelve una lista de resultados en el mismo
+    orden (un resultado puede ser una excepción). Cada petición espera su propio
+    `asyncio.Future`, que se resuelve con su resultado cuando termina el lote.
+    Debe iniciarse dentro del event loop (start).
+    """
+    def __init__(self, handler: Callable[[List[Any]], Awaitable[List[Any]]], max_batch_size: int = 8,
+                 max_wait: float = 0.05):
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._inflight: set = set()
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Detiene el despachador: espera los lotes en curso y hace fallar las peticiones que
+        seguían en la cola (sin _run nadie las procesaría y quedarían esperando para siempre).
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, *self._inflight, return_exceptions=True)
+            self._task = None
+
+        if self._queue is not None:
+            pending = []
+            while not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+            self._fail(pending)
+
+    @staticmethod
+    def _fail(batch: List[Tuple[Any, asyncio.Future]]):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(RuntimeError("El despachador se detuvo antes de procesar la petición."))
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Encola una petición y espera su resultado.
+        """
+        if self._task is None:
+            raise RuntimeError("El despachador no está iniciado.")
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect_batch(self) -> List[Tuple[Any, asyncio.Future]]:
+        """
+        Espera la primera petición y reúne las que lleguen hasta llenar el lote o agotar la ventana.
+        """
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        try:
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # stop() durante la ventana: las peticiones ya reunidas no llegarán a enviarse
+            self._fail(batch)
+            raise
+        return batch
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        try:
+            results = await self.handler([item for item, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            # La petición pudo cancelarse (cliente desconectado) mientras esperaba
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            # El lote se envía en segundo plano para seguir reuniendo el siguiente mientras tanto
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
@@ -0,0 +1,229 @@
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+from typing import List
+
+import httpx
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# HTTP/2 solo está disponible si el paquete 'h2' está instalado (pip install httpx[http2])
+_HTTP2_AVAILABLE = find_spec('h2') is not None
+
+# Conexiones persistentes: se reutilizan entre lotes en lugar de abrir una por petición
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=40, max_connections=100, keepalive_expiry=30.0)
+
+# Carpeta del modelo ONNX exportado: database/onnx en la raíz del proyecto, sin depender del directorio de trabajo
+_DEFAULT_ONNX_MODEL_DIR = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'database', 'onnx', 'mxbai-embed-large-v1')
+)
+
+
+def normalize_embeddings(embeddings: List[List[float]]) -> np.ndarray:
+    """
+    Normaliza cada embedding a norma L2 = 1.
+
+    Con vectores unitarios el producto interno equivale a la similitud coseno,
+    así que Chroma puede usar el espacio 'ip' (un solo producto punto por comparación).
+    """
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class OllamaBatchEmbeddings(Embeddings):
+    """
+    Generador de embeddings que usa el endpoint por lotes de Ollama (POST /api/embed).
+
+    Una sola petición HTTP embebe un lote de textos. Los lotes se reparten en round-robin
+    entre los servidores de OLLAMA_HOSTS (separados por comas) y se envían en paralelo;
+    cada hilo mantiene su propio cliente HTTP con keep-alive.
+
+    `keep_alive` indica a Ollama cuánto tiempo mantener el modelo cargado en memoria
+    (por defecto OLLAMA_KEEP_ALIVE o '24h'), para no pagar la carga en frío en cada consulta.
+    """
+    def __init__(self, model: str, hosts: List[str] | None = None, batch_size: int = 32, timeout: float = 120.0,
+                 keep_alive: str | None = None):
+        if hosts is None:
+            hosts = os.getenv('OLLAMA_HOSTS', 'http://localhost:11434').split(',')
+
+        self.model = model
+        self.keep_alive = keep_alive or os.getenv('OLLAMA_KEEP_ALIVE', '24h')
+        # Con OLLAMA_HOSTS vacío (o solo comas) se usa el servidor local por defecto
+        self.hosts = [host.strip().rstrip('/') for host in hosts if host.strip()] or ['http://localhost:11434']
+        self.batch_size = batch_size
+        self.timeout = timeout
+
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=2 * len(self.hosts))
+
+    def _client(self) -> httpx.Client:
+        """
+        Devuelve el cliente HTTP del hilo actual, creándolo la primera vez.
+        """
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = httpx.Client(http2=_HTTP2_AVAILABLE, limits=_HTTP_LIMITS, timeout=self.timeout)
+            self._local.client = client
+        return client
+
+    def _embed_sequential(self, host: str, texts: List[str]) -> List[List[float]]:
+        """
+        Respaldo para servidores sin /api/embed: una petición por texto contra /api/embeddings.
+        """
+        embeddings = []
+        for text in texts:
+            response = self._client().post(
+                f'{host}/api/embeddings',
+                json={'model': self.model, 'prompt': text, 'keep_alive': self.keep_alive}
+            )
+            response.raise_for_status()
+            embeddings.append(response.json()['embedding'])
+        return embeddings
+
+    def _embed_batch(self, host: str, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        response = self._client().post(
+            f'{host}/api/embed',
+            json={'model': self.model, 'input': texts, 'keep_alive': self.keep_alive}
+        )
+
+        # Versiones antiguas de Ollama no conocen /api/embed o no devuelven 'embeddings'
+        if response.status_code == 404:
+            return self._embed_sequential(host, texts)
+        response.raise_for_status()
+
+        embeddings = response.json().get('embeddings')
+        if not embeddings:
+            return self._embed_sequential(host, texts)
+        return embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+
+        # map conserva el orden de los lotes aunque terminen en distinto orden
+        results = self._executor.map(self._embed_batch, itertools.cycle(self.hosts), batches)
+        return [embedding for batch in results for embedding in batch]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch(self.hosts[0], [text])[0]
+
+
+class TEIEmbeddings(Embeddings):
+    """
+    Cliente de Text Embeddings Inference (TEI) de HuggingFace.
+
+    TEI agrupa las peticiones en el servidor (continuous batching) y usa kernels de GPU,
+    por lo que sirve el mismo modelo mxbai-embed-large bastante más rápido que Ollama:
+
+        docker run --gpus all -p 8080:80 ghcr.io/huggingface/text-embeddings-inference:latest \
+            --model-id mixedbread-ai/mxbai-embed-large-v1
+    """
+    def __init__(self, base_url: str | None = None, batch_size: int = 32, timeout: float = 120.0):
+        self.base_url = (base_url or os.getenv('TEI_URL', 'http://localhost:8080')).rstrip('/')
+        # Tamaño máximo de cada petición (TEI rechaza con 413 lotes mayores a --max-client-batch-size)
+        self.batch_size = batch_size
+        self._client = httpx.Client(http2=_HTTP2_AVAILABLE, limits=_HTTP_LIMITS, timeout=timeout)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        response = self._client.post(f'{self.base_url}/embed', json={'inputs': texts})
+        response.raise_for_status()
+        return response.json()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        embeddings = []
+        for start in range(0, len(texts), self.batch_size):
+            embeddings.extend(self._embed_batch(texts[start:start + self.batch_size]))
+        return embeddings
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0]
+
+
+class ONNXEmbeddings(Embeddings):
+    """
+    Genera los embeddings dentro del propio proceso con ONNX Runtime (CPU), sin servidor HTTP.
+
+    La primera vez exporta mxbai-embed-large-v1 a ONNX, le aplica cuantización dinámica int8
+    y lo guarda en `model_dir` (ONNX_MODEL_DIR); las siguientes ejecuciones cargan ese archivo.
+    Requiere: pip install optimum[onnxruntime]
+    """
+    def __init__(self, model_id: str = 'mixedbread-ai/mxbai-embed-large-v1', model_dir: str | None = None,
+                 batch_size: int = 32, max_length: int = 512):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from transformers import AutoTokenizer
+
+        model_dir = model_dir or os.getenv('ONNX_MODEL_DIR', _DEFAULT_ONNX_MODEL_DIR)
+        quantized_file = 'model_quantized.onnx'
+
+        if not os.path.exists(os.path.join(model_dir, quantized_file)):
+            print(f"Exportando {model_id} a ONNX int8 en {model_dir} (solo la primera vez)...")
+            model = ORTModelForFeatureExtraction.from_pretrained(model_id, export=True)
+            quantizer = ORTQuantizer.from_pretrained(model)
+            quantizer.quantize(save_dir=model_dir, quantization_config=AutoQuantizationConfig.avx2(is_static=False))
+            AutoTokenizer.from_pretrained(model_id).save_pretrained(model_dir)
+
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = ORTModelForFeatureExtraction.from_pretrained(
+            model_dir, file_name=quantized_file, provider='CPUExecutionProvider'
+        ).model
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        # El tokenizador rápido de HuggingFace no admite llamadas concurrentes desde varios hilos
+        self._tokenizer_lock = threading.Lock()
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        with self._tokenizer_lock:
+            inputs = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors='np')
+
+        feed = {name: value.astype(np.int64) for name, value in inputs.items() if name in self._input_names}
+        last_hidden_state = self.session.run(None, feed)[0]
+        # mxbai-embed-large usa el token [CLS] como embedding de la frase
+        return last_hidden_state[:, 0].tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        embeddings = []
+        for start in range(0, len(texts), self.batch_size):
+            embeddings.extend(self._embed_batch(texts[start:start + self.batch_size]))
+        return embeddings
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0]
+
+
+def crear_embeddings(backend: str | None = None) -> Embeddings:
+    """
+    Crea el generador de embeddings configurado en EMBEDDINGS_BACKEND ('ollama', 'tei' u 'onnx').
+
+    Todos sirven el modelo mxbai-embed-large, así que los vectores son compatibles con la colección.
+    Por defecto se usa Ollama (el backend con el que se construyó la colección); ONNX en proceso
+    es opcional y requiere dependencias adicionales.
+    """
+    backend = backend or os.getenv('EMBEDDINGS_BACKEND', 'ollama')
+
+    if backend == 'onnx':
+        try:
+            return ONNXEmbeddings()
+        except ImportError as e:
+            print(f"ERROR: EMBEDDINGS_BACKEND=onnx requiere 'pip install optimum[onnxruntime]' ({e}).")
+            raise
+    if backend == 'tei':
+        return TEIEmbeddings()
+    if backend == 'ollama':
+        return OllamaBatchEmbeddings(model='mxbai-embed-large')
+
+    raise ValueError(f"EMBEDDINGS_BACKEND desconocido: '{backend}'. Usa 'ollama', 'tei' u 'onnx'.")
@@ -0,0 +1,140 @@
+from typing import List, Tuple
+
+import numpy as np
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+# Filas procesadas por bloque al buscar: acota la memoria temporal
+_SEARCH_BLOCK_ROWS = 4096
+
+# Candidatos de la etapa binaria que se reordenan con el producto interno completo
+_RERANK_CANDIDATES = 200
+
+# Número de bits a 1 de cada byte (popcount por tabla, válido en cualquier versión de NumPy)
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint16)
+
+
+def _quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Cuantiza un bloque de vectores FP32.
+
+    Devuelve los códigos int8 con una escala por vector (para reordenar) y los bits de
+    signo empaquetados (para la primera etapa por distancia de Hamming).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    bits = np.packbits(vectors > 0, axis=1)
+    return codes, scales.astype(np.float32), bits
+
+
+class QuantizedIndex:
+    """
+    Índice en memoria con los embeddings de la colección cuantizados.
+
+    El HNSW de Chroma solo almacena FP32 (4 KB por vector de 1024 dimensiones). Aquí cada
+    vector se guarda dos veces en formato reducido:
+      - 1 bit por dimensión (128 bytes): la búsqueda recorre solo estos bits y calcula la
+        distancia de Hamming con la consulta.
+      - int8 con una escala por vector (1 KB): se usa para reordenar en FP32 los
+        `_RERANK_CANDIDATES` mejores candidatos de la etapa binaria.
+
+    Chroma se sigue usando para los documentos y metadatos: la búsqueda devuelve los IDs
+    y el texto se recupera por ID.
+    """
+    def __init__(self, ids: List[str], codes: np.ndarray, scales: np.ndarray, bits: np.ndarray):
+        self.ids = np.asarray(ids)
+        self.codes = np.asarray(codes, dtype=np.int8)
+        self.scales = np.asarray(scales, dtype=np.float32)
+        self.bits = np.asarray(bits, dtype=np.uint8)
+
+    @classmethod
+    def from_vectors(cls, ids: List[str], vectors: np.ndarray) -> 'QuantizedIndex':
+        return cls(ids, *_quantize(vectors))
+
+    @classmethod
+    def from_collection(cls, collection, page_size: int = 1000) -> 'QuantizedIndex':
+        """
+        Construye el índice leyendo los embeddings de una colección de Chroma por páginas
+        (cada página se cuantiza al leerla, sin cargar toda la colección en FP32).
+        """
+        ids, codes, scales, bits = [], [], [], []
+        offset = 0
+        while True:
+            page = collection.get(include=['embeddings'], limit=page_size, offset=offset)
+            if not page['ids']:
+                break
+            ids.extend(page['ids'])
+            page_codes, page_scales, page_bits = _quantize(page['embeddings'])
+            codes.append(page_codes)
+            scales.append(page_scales)
+            bits.append(page_bits)
+            offset += len(page['ids'])
+
+        if not ids:
+            return cls([], np.zeros((0, 0), dtype=np.int8), np.zeros(0, dtype=np.float32), np.zeros((0, 0), dtype=np.uint8))
+        return cls(ids, np.concatenate(codes), np.concatenate(scales), np.concatenate(bits))
+
+    def save(self, path: str):
+        np.savez(path, ids=self.ids, codes=self.codes, scales=self.scales, bits=self.bits)
+
+    @classmethod
+    def load(cls, path: str) -> 'QuantizedIndex':
+        data = np.load(path)
+        return cls(data['ids'].tolist(), data['codes'], data['scales'], data['bits'])
+
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes + self.bits.nbytes
+
+    def _dequantize(self, rows: np.ndarray) -> np.ndarray:
+        return self.codes[rows].astype(np.float32) * self.scales[rows, None]
+
+    def _hamming_candidates(self, query: np.ndarray, n: int) -> np.ndarray:
+        """
+        Devuelve las `n` filas con menor distancia de Hamming entre sus bits de signo y los de la consulta.
+        """
+        query_bits = np.packbits(query > 0)
+        distances = np.empty(len(self.ids), dtype=np.uint16)
+        for start in range(0, len(self.ids), _SEARCH_BLOCK_ROWS):
+            block = self.bits[start:start + _SEARCH_BLOCK_ROWS]
+            distances[start:start + len(block)] = _POPCOUNT[np.bitwise_xor(block, query_bits)].sum(axis=1)
+
+        n = min(n, len(distances))
+        return np.argpartition(distances, n - 1)[:n]
+
+    def _top_rows(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Devuelve las filas con mayor producto interno con la consulta y sus puntuaciones, ordenadas.
+
+        Primero se filtran candidatos por Hamming y después se reordenan con el producto interno FP32.
+        """
+        candidates = self._hamming_candidates(query, max(k, _RERANK_CANDIDATES))
+        scores = self._dequantize(candidates) @ query
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return candidates[top], scores[top]
+
+    def search(self, query_embedding: List[float], k: int) -> List[Tuple[str, float]]:
+        """
+        Devuelve los `k` IDs con mayor producto interno con la consulta (coseno si ambos están normalizados).
+        """
+        if len(self.ids) == 0:
+            return []
+
+        rows, scores = self._top_rows(np.asarray(query_embedding, dtype=np.float32), k)
+        return [(str(self.ids[row]), float(score)) for row, score in zip(rows, scores)]
+
+    def mmr_search(self, query_embedding: List[float], k: int, fetch_k: int = 30, lambda_mult: float = 0.5) -> List[str]:
+        """
+        Toma los `fetch_k` vectores más cercanos y elige `k` con Maximal Marginal Relevance
+        (relevantes para la consulta pero poco redundantes entre sí).
+        """
+        if len(self.ids) == 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        rows, _ = self._top_rows(query, fetch_k)
+        selected = maximal_marginal_relevance(query, self._dequantize(rows), lambda_mult=lambda_mult, k=k)
+        return [str(self.ids[rows[i]]) for i in selected]
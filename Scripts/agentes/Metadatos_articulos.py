@@ -0,0 +1,68 @@
+import functools
+import os
+import pickle
+from typing import Dict
+
+import pandas as pd
+
+
+def _read_metadata_csv(csv_filepath: str) -> Dict[str, str]:
+    """
+    Lee el CSV y mapea cada título (limpio, sin ruta ni extensión) a su link.
+    """
+    # Se asume que el CSV usa UTF-8 (con o sin BOM) y las columnas son 'title' y 'link'
+    df = pd.read_csv(csv_filepath, usecols=['title', 'link'], dtype=str, encoding='utf-8-sig').fillna('')
+
+    # El título del CSV podría contener una ruta si el CSV no es perfecto:
+    # se deja solo el nombre del archivo, sin ruta ni extensión, para estandarizar la clave.
+    keys = df['title'].str.strip().map(lambda title: os.path.splitext(os.path.basename(title))[0])
+    links = df['link'].str.strip()
+
+    # La clave del mapa es el título limpio; se descartan filas sin título o sin link
+    valid = (keys != '') & (links != '')
+    return dict(zip(keys[valid], links[valid]))
+
+
+@functools.lru_cache(maxsize=4)
+def _load_cached(csv_filepath: str, mtime_ns: int) -> Dict[str, str]:
+    """
+    Carga el mapa de metadatos una sola vez por versión del CSV (identificada por su mtime).
+
+    Además del caché en memoria, el resultado se guarda en un archivo .pkl junto al CSV
+    para que otros procesos (p. ej. recargas del servidor) no vuelvan a leer el CSV.
+    """
+    pickle_path = csv_filepath + '.pkl'
+    try:
+        with open(pickle_path, 'rb') as file:
+            cached = pickle.load(file)
+        if cached['mtime_ns'] == mtime_ns:
+            return cached['metadata_map']
+    except (OSError, pickle.UnpicklingError, KeyError, EOFError):
+        pass
+
+    metadata_map = _read_metadata_csv(csv_filepath)
+    try:
+        with open(pickle_path, 'wb') as file:
+            pickle.dump({'mtime_ns': mtime_ns, 'metadata_map': metadata_map}, file)
+    except OSError as e:
+        print(f"⚠️ No se pudo guardar el caché de metadatos en {pickle_path}: {e}")
+    return metadata_map
+
+
+def load_metadata_from_csv(csv_filepath: str) -> Dict[str, str]:
+    """
+    Carga los títulos y links del CSV, mapeando el título a su URL.
+    
+    Se limpia la clave del título eliminando cualquier ruta y la extensión.
+    El resultado se reutiliza mientras el CSV no cambie.
+    """
+    try:
+        metadata_map = _load_cached(csv_filepath, os.stat(csv_filepath).st_mtime_ns)
+        print(f"DEBUG: CSV cargado exitosamente. Se mapearon {len(metadata_map)} registros de metadatos.")
+        return metadata_map
+    except FileNotFoundError:
+        print(f"⚠️ Error: El archivo CSV no se encontró en la ruta: {csv_filepath}. Los links no estarán disponibles.")
+        return {}
+    except Exception as e:
+        print(f"❌ Error al procesar el archivo CSV: {e}")
+        return {}
@@ -1,13 +1,13 @@
 from langchain_chroma import Chroma
-from langchain_ollama import OllamaEmbeddings
 # Importación para Gemini (reemplaza a ChatOpenAI)
 from langchain_google_genai import ChatGoogleGenerativeAI 
 import os
 
 from dotenv import load_dotenv
 
-# Nota: Asumo que el nombre correcto es 'PokemonSemanticAgent' basado en el 'collection_name'
 from Scripts.agentes.Agente_semantico import BiologySemanticAgent
+from Scripts.agentes.Generador_embeddings import crear_embeddings
+from Scripts.agentes.Metadatos_articulos import load_metadata_from_csv
 
 load_dotenv('Hunger-Wings\.env')
 
@@ -19,11 +19,9 @@ gemini_llm = ChatGoogleGenerativeAI(
     # Si quieres especificarla explícitamente: api_key=os.getenv('GEMINI_API_KEY')
 )
 
-embeddings_generator = OllamaEmbeddings(
-    model='mxbai-embed-large'
-)
+# Embeddings con Ollama por defecto; EMBEDDINGS_BACKEND permite usar TEI u ONNX int8 en proceso
+embeddings_generator = crear_embeddings()
 
-# Nota: Cambié la pregunta a una más relevante para la colección 'pokemon'
 question = 'xperimental animal procedures for STS-131'
 
 vector_store = Chroma(
@@ -32,14 +30,19 @@ vector_store = Chroma(
     persist_directory='./database/chromadb'
 )
 
-# 2. Asignación del nuevo LLM al Agente
+# 2. Agente con el LLM de Gemini y el mapa título -> link del CSV
 agent = BiologySemanticAgent(
     vector_store,
-    gemini_llm # Usamos la instancia de Gemini
+    gemini_llm,
+    load_metadata_from_csv('./database/SB_publication_PMC.csv')
 )
 
-# El resto del flujo permanece igual
-response = agent.generate_stream(question, 5)
+# Sin k_chunks: el agente elige cuántos chunks recuperar según la pregunta
+response = agent.generate_stream(question)
 
-for token in response:
-    print(token.content, end='')
\ No newline at end of file
+# Cada elemento es el JSON parcial: se imprime solo la parte nueva del resumen
+printed = 0
+for partial in response:
+    resumen = (partial.get('reporte') or {}).get('resumen') or ''
+    print(resumen[printed:], end='', flush=True)
+    printed = len(resumen)
\ No newline at end of file
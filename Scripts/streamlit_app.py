@@ -2,13 +2,14 @@ import streamlit as st
 
 # Importaciones para Gemini
 from langchain_google_genai import ChatGoogleGenerativeAI 
-from langchain_ollama import OllamaEmbeddings
 from langchain_chroma import Chroma
 
 from dotenv import load_dotenv
 
 # Asegúrate de que esta importación sea correcta y que la clase esté disponible
 from agentes.Agente_semantico import BiologySemanticAgent 
+from agentes.Generador_embeddings import crear_embeddings
+from agentes.Metadatos_articulos import load_metadata_from_csv
 
 
 HUMAN = "HUMAN"
@@ -21,42 +22,47 @@ st.set_page_config(
 )
 
 
+@st.cache_resource
+def get_agent() -> BiologySemanticAgent:
+    """
+    Construye el agente una sola vez por proceso: todas las sesiones comparten el mismo
+    modelo de embeddings, cliente de Chroma y cliente de Gemini.
+    """
+    # Carga las variables de entorno (incluyendo GEMINI_API_KEY)
+    load_dotenv('.env')
+
+    # --- 1. Inicializar Gemini LLM ---
+    gemini_llm = ChatGoogleGenerativeAI(
+        model='gemini-2.5-flash',
+        # LangChain busca la API Key en el entorno
+    )
+
+    # --- 2. Inicializar Embeddings (mxbai en el propio proceso con ONNX) ---
+    embeddings_generator = crear_embeddings()
+
+    # --- 3. Inicializar Vector Store (Chroma) ---
+    vector_store = Chroma(
+        # Cambiar el nombre de la colección a 'biology'
+        collection_name='biology', 
+        embedding_function=embeddings_generator,
+        persist_directory='./database/chromadb'
+    )
+
+    # --- 4. Inicializar el Agente de Biología con el mapa título -> link del CSV ---
+    return BiologySemanticAgent( 
+        vector_store,
+        gemini_llm,
+        load_metadata_from_csv('./database/SB_publication_PMC.csv')
+    )
+
+
 class StreamlitUI:
     def __init__(self):
-        # Carga las variables de entorno (incluyendo GEMINI_API_KEY)
-        load_dotenv('.env') 
         self.__init_semantic_agent()
 
     def __init_semantic_agent(self):
         if "semantic_agent" not in st.session_state:
-            
-            # --- 1. Inicializar Gemini LLM ---
-            gemini_llm = ChatGoogleGenerativeAI(
-                model='gemini-2.5-flash',
-                # LangChain busca la API Key en el entorno
-            )
-            
-            # --- 2. Inicializar Embeddings (Ollama/mxbai) ---
-            embeddings_generator = OllamaEmbeddings(
-                model='mxbai-embed-large'
-            )
-
-            # --- 3. Inicializar Vector Store (Chroma) ---
-            vector_store = Chroma(
-                # Cambiar el nombre de la colección a 'biology'
-                collection_name='biology', 
-                embedding_function=embeddings_generator,
-                persist_directory='./database/chromadb'
-            )
-
-            # --- 4. Inicializar el Agente de Biología ---
-            # Ahora usa la clase y el LLM de Biología
-            agent = BiologySemanticAgent( 
-                vector_store,
-                gemini_llm
-            )
-
-            st.session_state.semantic_agent = agent
+            st.session_state.semantic_agent = get_agent()
     
     # --- Adaptación de la Interfaz ---
 
@@ -95,12 +101,20 @@ class StreamlitUI:
 
     def handle_ai_message(self, prompt: str):
         agent = st.session_state.semantic_agent
-        # Se sigue pasando '5' como el número de chunks a recuperar (k)
-        response = agent.generate_stream(prompt, 5) 
+        # El número de chunks (k) y su longitud se eligen según la pregunta
+        response = agent.generate_stream(prompt)
 
         with st.chat_message(AI):
-            # st.write_stream maneja la salida en tiempo real
-            chat_response = st.write_stream(response) 
+            # Cada elemento es el JSON parcial: se va mostrando el resumen mientras se genera
+            placeholder = st.empty()
+            chat_response = ""
+            for partial in response:
+                chat_response = (partial.get("reporte") or {}).get("resumen") or ""
+                placeholder.markdown(chat_response)
+
+            if not chat_response:
+                chat_response = "No se pudo generar una respuesta."
+                placeholder.markdown(chat_response)
 
         st.session_state.messages.append(
             {
@@ -1,18 +1,26 @@
 # api.py
 
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import os
 from dotenv import load_dotenv
 from pathlib import Path
+import asyncio
 import json
+import httpx
 
 # --- Configuración del Backend RAG ---
 # Usaremos una función para inicializar el agente RAG (similar a Streamlit)
+import chromadb
 from langchain_chroma import Chroma
-from langchain_ollama import OllamaEmbeddings
+from langchain_core.caches import InMemoryCache
+from langchain_core.globals import set_llm_cache
 from langchain_google_genai import ChatGoogleGenerativeAI
 from Scripts.agentes.Agente_semantico import BiologySemanticAgent
+from Scripts.agentes.Generador_embeddings import crear_embeddings, _HTTP2_AVAILABLE
+from Scripts.agentes.Indice_cuantizado import QuantizedIndex
+from Scripts.agentes.Metadatos_articulos import load_metadata_from_csv
 
 CURRENT_FILE_PATH = Path(__file__).resolve()
 
@@ -32,60 +40,154 @@ else:
     print(f"ERROR: Archivo .env no encontrado en: {DOTENV_PATH}")
 
 
-# Inicialización del Agente RAG (Global, para que solo cargue una vez)
-# ====================================================================
-try:
-    # 1. Configuración del LLM (Esto ya está bien)
-    gemini_key = os.getenv('GEMINI_API_KEY')
+# Rutas de los datos del backend RAG
+DB_PATH = BASE_DIR / 'database' / 'chromadb'
+CSV_PATH = BASE_DIR / 'database' / 'SB_publication_PMC.csv'
+# Índice cuantizado generado por Procesamiento.py o Cuantizar_vectores.py (opcional: sin él se busca en el HNSW de Chroma)
+QUANTIZED_INDEX_PATH = BASE_DIR / 'database' / 'quantized_index.npz'
+
+# Agente RAG global: se inicializa en el evento 'startup' (una sola vez por proceso)
+RAG_AGENT = None
+
+# Cliente HTTP compartido por todas las llamadas a Gemini: conexiones keep-alive reutilizadas
+# entre peticiones (y HTTP/2 si el paquete 'h2' está instalado). Se cierra en 'shutdown'.
+GEMINI_HTTP_CLIENT = httpx.AsyncClient(
+    http2=_HTTP2_AVAILABLE,
+    timeout=60.0,
+    limits=httpx.Limits(max_keepalive_connections=100, max_connections=200, keepalive_expiry=300.0)
+)
+
+
+def _load_quantized_index() -> QuantizedIndex | None:
+    return QuantizedIndex.load(str(QUANTIZED_INDEX_PATH)) if QUANTIZED_INDEX_PATH.exists() else None
+
+
+def _create_gemini_llm(api_key: str | None) -> ChatGoogleGenerativeAI:
+    """
+    Crea el LLM de Gemini usando GEMINI_HTTP_CLIENT para las llamadas asíncronas.
+
+    ChatGoogleGenerativeAI no admite un cliente httpx propio, así que se reemplaza el cliente
+    del SDK por uno con las mismas opciones (URL, versión de la API, cabeceras) más el cliente
+    compartido (esto también evita que el SDK cambie a aiohttp si está instalado).
+
+    El reemplazo usa atributos internos de langchain_google_genai y google-genai: si una
+    versión distinta no los tiene, se avisa y se sigue con el cliente original del SDK.
+    """
     gemini_llm = ChatGoogleGenerativeAI(
         model='gemini-2.5-flash',
-        api_key=gemini_key,
+        api_key=api_key,
         response_mime_type="application/json"
     )
 
-    # 2. Configuración de Chroma
-    # ------------------------------------------------------------------
-    # ¡ASEGÚRATE DE QUE ESTA LÍNEA ESTÉ PRESENTE Y SIN ERRORES!
-    embeddings_generator = OllamaEmbeddings(model='mxbai-embed-large')
-    # ------------------------------------------------------------------
-    
-    DB_PATH = BASE_DIR / 'database' / 'chromadb'
-    
-    vector_store = Chroma(
-        collection_name='biology',
-        # Aquí es donde usa la variable:
-        embedding_function=embeddings_generator, 
-        persist_directory=str(DB_PATH)
-    )
+    original_client = gemini_llm.client
+    try:
+        from google import genai
+        from langchain_google_genai.chat_models import _ClientCleanup
 
-    # 3. Inicialización del Agente
-    RAG_AGENT = BiologySemanticAgent(vector_store, gemini_llm)
-    print("FastAPI: Agente RAG inicializado con éxito.")
+        http_options = original_client._api_client._http_options.model_copy(
+            update={'httpx_async_client': GEMINI_HTTP_CLIENT}
+        )
+        shared_client = genai.Client(api_key=api_key, http_options=http_options)
+        client_cleanup = _ClientCleanup(shared_client)
+    except Exception as e:
+        print(f"ADVERTENCIA: no se pudo usar el cliente HTTP compartido para Gemini, se usa el del SDK: {e}")
+        return gemini_llm
 
-except Exception as e:
-    # Esto atrapará cualquier error y evitará que el servidor muera
-    print(f"ERROR CRÍTICO al inicializar el agente RAG: {e}")
-    RAG_AGENT = None
-# ====================================================================
+    # El cierre automático del LLM pasa a ser del cliente nuevo; el original ya no se usa
+    gemini_llm.client = shared_client
+    gemini_llm._client_cleanup = client_cleanup
+    original_client.close()
+    return gemini_llm
+
+
+async def _warmup(vector_store: Chroma, gemini_llm: ChatGoogleGenerativeAI):
+    """
+    Calentamiento antes de la primera consulta real: una búsqueda de prueba carga el modelo de
+    embeddings y el índice HNSW de Chroma en memoria, y un 'ping' de 1 token a Gemini abre las
+    conexiones (TLS) del cliente compartido. Un fallo aquí no impide arrancar el servidor.
+    """
+    results = await asyncio.gather(
+        asyncio.to_thread(vector_store.similarity_search, "warmup", 1),
+        gemini_llm.ainvoke("ping", max_output_tokens=1),
+        return_exceptions=True
+    )
+    for name, result in zip(("Chroma", "Gemini"), results):
+        if isinstance(result, Exception):
+            print(f"ADVERTENCIA: falló el calentamiento de {name}: {result}")
 
 
 app = FastAPI()
 
+@app.on_event("startup")
+async def init_rag():
+    """
+    Inicializa el agente RAG sin bloquear la importación del módulo.
+
+    Los componentes lentos (modelo de embeddings, cliente de Chroma, cliente de Gemini, CSV de
+    links e índice cuantizado) se cargan a la vez en hilos: el arranque tarda lo que el más lento.
+    """
+    global RAG_AGENT
+    try:
+        gemini_key = os.getenv('GEMINI_API_KEY')
+        (embeddings_generator, chroma_client, gemini_llm,
+         article_link_map, quantized_index) = await asyncio.gather(
+            asyncio.to_thread(crear_embeddings),
+            asyncio.to_thread(chromadb.PersistentClient, path=str(DB_PATH)),
+            asyncio.to_thread(_create_gemini_llm, gemini_key),
+            asyncio.to_thread(load_metadata_from_csv, str(CSV_PATH)),
+            asyncio.to_thread(_load_quantized_index),
+        )
+
+        vector_store = Chroma(
+            client=chroma_client,
+            collection_name='biology',
+            embedding_function=embeddings_generator
+        )
+
+        RAG_AGENT = BiologySemanticAgent(vector_store, gemini_llm, article_link_map, quantized_index=quantized_index)
+        print("FastAPI: Agente RAG inicializado con éxito.")
+
+        await _warmup(vector_store, gemini_llm)
+
+        # Despachador que agrupa las llamadas concurrentes a Gemini (ventana de 50 ms). Se inicia
+        # aquí y no en otro evento de startup, porque RAG_AGENT solo existe al terminar este
+        RAG_AGENT.enable_batching(max_batch_size=8, max_wait=0.05)
+
+    except Exception as e:
+        # Esto atrapará cualquier error y evitará que el servidor muera
+        print(f"ERROR CRÍTICO al inicializar el agente RAG: {e}")
+        RAG_AGENT = None
+
+@app.on_event("startup")
+async def enable_llm_cache():
+    """
+    Caché global de respuestas del LLM. El prompt incluye la pregunta y los chunks recuperados,
+    así que una misma pregunta con el mismo contexto se responde sin volver a llamar a Gemini.
+    """
+    set_llm_cache(InMemoryCache(maxsize=1024))
+
+@app.on_event("shutdown")
+async def stop_batching():
+    if RAG_AGENT is not None and RAG_AGENT.dispatcher is not None:
+        await RAG_AGENT.dispatcher.stop()
+    await GEMINI_HTTP_CLIENT.aclose()
+
 # Modelo de datos que el frontend enviará
 class Query(BaseModel):
     question: str
-    k_chunks: int = 5 # Valor por defecto de chunks a recuperar
+    # Chunks a recuperar; sin valor, el agente lo elige según la pregunta (2 a 8)
+    k_chunks: int | None = None
 
 @app.post("/api/query_json")
-def get_report(query: Query):
+async def get_report(query: Query):
     """
     Punto final para recibir una pregunta y devolver el reporte y grafo JSON.
     """
     if RAG_AGENT is None:
         raise HTTPException(status_code=500, detail="El backend RAG no pudo inicializarse.")
     
-    # 1. Ejecutar el agente
-    json_data = RAG_AGENT.generate(query.question, query.k_chunks)
+    # 1. Ejecutar el agente (asíncrono: no bloquea el event loop mientras espera a Chroma/Gemini)
+    json_data = await RAG_AGENT.agenerate(query.question, query.k_chunks)
 
     if json_data is None:
         raise HTTPException(status_code=500, detail="La generación JSON falló. El LLM devolvió un formato inválido.")
@@ -93,6 +195,29 @@ def get_report(query: Query):
     # 2. Devolver el diccionario de Python. FastAPI lo serializa automáticamente a JSON.
     return json_data
 
+@app.post("/api/query_stream")
+async def stream_report(query: Query):
+    """
+    Igual que /api/query_json, pero envía el reporte a medida que el LLM lo genera.
+
+    La respuesta es NDJSON: cada línea es el JSON parcial construido hasta ese momento.
+    La última línea es el reporte completo y validado, o {"error": ...} si no se pudo generar
+    o quedó truncado (las líneas anteriores son entonces solo parciales).
+    """
+    if RAG_AGENT is None:
+        raise HTTPException(status_code=500, detail="El backend RAG no pudo inicializarse.")
+
+    async def ndjson_lines():
+        complete = False
+        async for partial, complete in RAG_AGENT.astream_with_status(query.question, query.k_chunks):
+            yield json.dumps(partial, ensure_ascii=False) + "\n"
+
+        # El estado HTTP ya se envió: si no hubo un reporte completo, el error va como última línea
+        if not complete:
+            yield json.dumps({"error": "La generación JSON falló."}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
 # CORS (Crucial para el desarrollo de Frontend/Backend)
 from fastapi.middleware.cors import CORSMiddleware
 
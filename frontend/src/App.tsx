@@ -78,9 +78,9 @@ const defaultData: DataJSON = {
 
 // 🌐 FUNCIÓN DE LLAMADA HTTP AL BACKEND (FastAPI)
 async function fetchRAGReport(question: string): Promise<DataJSON | null> {
+  // Sin k_chunks: el backend elige cuántos fragmentos recuperar según la pregunta
   const dataToSend = {
     question: question,
-    k_chunks: 5,
   };
 
   console.log(`Enviando consulta a la API: ${question}`);